@@ -4,14 +4,35 @@ Calculate bits of entropy for passwords, cracking time, and check if password ha
 Tested to Python v3.11.6
 
 Changelog
+20261015 -  Added --file to check a list of passwords
+20261015 -  Prompt for the password itself when none is given, so it can be breach checked
+20261015 -  Added --filter Bloom filter of common breached passwords, built with --build-filter
+20261015 -  Added --offline lookup against a downloaded Pwned Passwords corpus
+20261015 -  Added local cache of haveibeenpwned.com range responses
 20240322 -  Added Moore's law alt calc and fixed some bone-headed math mistakes
 20240321 -  Added haveibeenpwned.com API check
 20240320 -  Added get_crack_time function
 20240308 -  Initial Code
 
-Usage: python3 password_entropy.py [password]
-- If a password is provided as an argument, it will return entropy value
-- If no password is provided, it will prompt for password variables and return entropy value
+Usage: python3 password_entropy.py [--offline DIR] [--filter FILE] [password]
+       python3 password_entropy.py [--offline DIR] [--filter FILE] --file PASSWORDS
+       python3 password_entropy.py --filter FILE --build-filter SOURCE
+- If a password is provided as an argument, it will return entropy value.
+  A password starting with -h or spelled like one of the options below needs
+  -- in front of it, e.g. python3 password_entropy.py -- -hunter2
+- If no password is provided, it will prompt for the password without echoing
+  it, or for password variables if that's left blank, and return entropy value
+- If --offline is given, the breach check is done against a downloaded Pwned
+  Passwords corpus in DIR instead of the API. DIR holds 256 files named 00.txt
+  through FF.txt by the first two hex chars of the hash, each sorted and with
+  one full SHA1_HASH:COUNT per line.
+- If --filter is given, the password is first checked against a Bloom filter
+  of common breached passwords in FILE, and the breach check is skipped when
+  it's found there. The filter is built once with --build-filter from a
+  SOURCE file in the Pwned Passwords SHA1_HASH:COUNT format, e.g. the top
+  million lines by count.
+- If --file is given, every password in PASSWORDS (one per line) is checked
+  and a one line summary printed for each
 
 Scale assumes anything less than 60 bits entropy is a weak password.
 - 9 character password with lower & upper & digit & symbol chars
@@ -57,12 +78,216 @@ limitations under the License.
 """
 
 
+import argparse
+import array
+import bisect
+import dbm
+import getpass
 import hashlib
 import math
-import requests
+import mmap
+import os
+import re
+import shelve
 import sys
+import threading
 import time
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+# As of 20240308, the fastest cracking rig was capable of 2.7 trillion gps and
+# is appended to the gps below at run time. See current_gps in __main__.
+GPS = (10_000, 5_000_000, 250_000_000_000, 1_000_000_000_000)  # Guesses per second
+MAGNITUDES = ((1_000_000_000_000_000_000, "∞ years"), (1_000_000_000_000_000, "quintillion years"), (1_000_000_000_000, "trillion years"), (1_000_000_000, "billion years"), (1_000_000, "million years"), (10_000, "thousand years"), (1, "years"))
+NEG_MAGNITUDES = ((.1, "months"), (.01, "days"), (.001, "hours"), (.0001, "minutes"), (.00001, "seconds"), (.000001, "less than a second"))
+
+# Both tables merged in ascending order, with log₂ of each magnitude as a
+# sorted array so the label for log₂ years can be found with bisect
+MAGNITUDE_LABELS = tuple(sorted(NEG_MAGNITUDES + MAGNITUDES))
+LOG2_MAGNITUDES = array.array('d', (math.log2(magnitude) for magnitude, _ in MAGNITUDE_LABELS))
+
+# Bloom filter of breached password hashes. 10 bits per entry and 7 hash
+# functions gives a false positive rate of about 1%.
+FILTER_BITS_PER_ENTRY = 10
+FILTER_HASHES = 7
+
+STRENGTHS = ((100, 'Critical'), (80, 'Important'), (60, 'Normal'), (0, 'Weak'))
+
+SYMBOLCHARS = "`~!@#$%^&*()-_=+[{]}\\|;:'\"/?,<.>"  # 32 symbols
+SYMBOL_SET = frozenset(SYMBOLCHARS)
+
+# Character class bits, and a lookup table of the class bits for every ASCII
+# byte. Bytes above 127 are never a whole character in UTF-8 so they map to 0.
+LOWER, UPPER, DIGIT, SYMBOL = 1, 2, 4, 8
+CLASS_LUT = bytes(
+    (LOWER if c.islower() else 0) | (UPPER if c.isupper() else 0) | (DIGIT if c.isdigit() else 0) | (SYMBOL if c in SYMBOL_SET else 0)
+    for c in map(chr, range(128))
+) + bytes(128)
+
+# str.translate table deleting every ASCII character, leaving only the
+# characters CLASS_LUT can't classify
+ASCII_DELETE = dict.fromkeys(range(128))
+
+# shelve doesn't support concurrent access, and --file runs lookups in parallel
+CACHE_LOCK = threading.Lock()
+
+# One session for all API calls, created on first use by get_session
+SESSION = None
+SESSION_LOCK = threading.Lock()
+
+# Set to cut get_request's retries short, e.g. on Ctrl-C, since lookups run on
+# worker threads that KeyboardInterrupt never reaches
+STOP_RETRIES = threading.Event()
+
+
+def build_filter(source, filter_file):
+    """
+    Build a Bloom filter of breached password hashes for check_filter
+
+    Parameters
+    ----------
+    source : string, file with one SHA1_HASH:COUNT per line
+    filter_file : string
+
+    Returns
+    -------
+    tuple : (hashes added to the filter, malformed lines skipped)
+    """
+
+    def source_hashes():
+        # The hash from each non-blank line, or None for a line without one,
+        # e.g. a header or comment
+        with open(source, errors="replace") as f:
+            for line in f:
+                line_hash = line.split(":", 1)[0].strip()
+                if line_hash:
+                    yield line_hash if re.fullmatch("[0-9A-Fa-f]{40}", line_hash) else None
+
+    entries = 0
+    skipped = 0
+    for line_hash in source_hashes():
+        if line_hash is None:
+            skipped += 1
+        else:
+            entries += 1
+
+    bits = bytearray(max(entries * FILTER_BITS_PER_ENTRY // 8, 1))
+    size = len(bits) * 8
+
+    for line_hash in source_hashes():
+        if line_hash is not None:
+            for position in get_filter_positions(line_hash, size):
+                bits[position >> 3] |= 1 << (position & 7)
+
+    with open(filter_file, "wb") as f:
+        f.write(bits)
+
+    return entries, skipped
+
+
+def check_filter(filter_bits, full_hash):
+    """
+    Check if a password hash is in a Bloom filter made by build_filter. False
+    means it's definitely not in the filter, True means it most likely is.
+
+    Parameters
+    ----------
+    filter_bits : bytes-like, the filter as returned by load_filter
+    full_hash : string, upper case SHA1 hex digest
+
+    Returns
+    -------
+    bool
+    """
+
+    if len(filter_bits) == 0:
+        return False
+
+    return all(filter_bits[position >> 3] & (1 << (position & 7)) for position in get_filter_positions(full_hash, len(filter_bits) * 8))
+
+
+def check_file(path, current_gps, offline, filter_bits, cache_file, cache_ttl):
+    """
+    Print entropy, use case, time to crack at current_gps and breaches for
+    every password in a file, one password per line
+
+    Parameters
+    ----------
+    path : string
+    current_gps : float
+    offline : string, directory of the downloaded corpus or None for the API
+    filter_bits : bytes-like from load_filter, or None
+    cache_file : string
+    cache_ttl : int, seconds a cached range is used before revalidating
+    """
+
+    # Wordlists aren't always valid UTF-8. surrogateescape keeps the original
+    # bytes so they still hash to what was in the file.
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        passwords = [line.rstrip("\r\n") for line in f if line.rstrip("\r\n")]
+
+    pw_bytes_list = [password.encode("utf-8", "surrogateescape") for password in passwords]  # Shared by the hash and get_pool
+    names = [pw_bytes.decode("utf-8", "replace") for pw_bytes in pw_bytes_list]  # Printable, bad bytes shown as �
+
+    pw = max(len("Password"), *(len(name) for name in names)) if names else len("Password")
+    cw = 25  # Column width for displayed output
+    time_header = f'Time to crack at {int(current_gps):,}/s'
+    tw = max(cw, len(time_header) + 1)
+
+    print(f"{'Password':<{pw}} {'Entropy':<{cw}} {'Use Case':<{cw}} {time_header:<{tw}} Breaches")
+
+    def stop_on_failure(future):
+        # Once one lookup has given up the API is down, so don't make every
+        # other password sit through its own backoff
+        if not future.cancelled() and isinstance(future.exception(), ConnectionError):
+            STOP_RETRIES.set()
+
+    # Breach checks run in parallel, sharing the session's connection pool
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    try:
+        rows = []
+
+        for password, pw_bytes, name in zip(passwords, pw_bytes_list, names):
+            # SHA1 is only used as the lookup key for the API, not for security
+            full_hash = hashlib.sha1(pw_bytes, usedforsecurity=False).hexdigest().upper()
+
+            if filter_bits is not None and check_filter(filter_bits, full_hash):
+                pwned = None  # Common breached password, no need to look it up
+            else:
+                pwned = executor.submit(get_pwned_count, full_hash, offline, cache_file, cache_ttl)
+                pwned.add_done_callback(stop_on_failure)
+
+            pool = get_pool(password, pw_bytes)
+            if pool:
+                entropy = len(password) * math.log2(pool)
+                crack_time = get_crack_time(pool, len(password), current_gps)[f'{int(current_gps):,}/s']
+            else:  # No character classes at all, e.g. only spaces
+                entropy = 0.0
+                crack_time = "less than a second"
+
+            rows.append((name, entropy, crack_time, pwned))
+
+        for name, entropy, crack_time, pwned in rows:
+            if pwned is None:
+                breaches = "likely"
+            else:
+                try:
+                    count = pwned.result()
+                except Exception:  # Any lookup failure, e.g. no API, missing shard, requests not installed
+                    breaches = "?"  # Not checked, which isn't the same as not found
+                else:
+                    breaches = "-" if count is None else f"{int(count):,}"
+
+            print(f"{name:<{pw}} {f'{entropy:.2f} bits':<{cw}} {get_strength(entropy):<{cw}} {crack_time:<{tw}} {breaches}")
+    except KeyboardInterrupt:
+        # Drop the queued lookups and cut short any running ones, rather than
+        # waiting for them all at exit
+        STOP_RETRIES.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    executor.shutdown()
 
 
 def get_crack_time(pool, length, current_gps):
@@ -74,48 +299,238 @@ def get_crack_time(pool, length, current_gps):
     ----------
     pool : int
     length: int
+    current_gps : float
 
     Returns
     -------
     dict : element 1: guesses/s, element 2: time to crack
     """
 
-    # As of 20240308, the fastest cracking rig was capable of 2.7 trillion gps 
-    # and is represented as the last number in the gps list below. See global
-    # variable current_gps below imports.
-    gps = [10_000, 5_000_000, 250_000_000_000, 1_000_000_000_000, current_gps]  # Guesses per second
-    magnitudes = [(1_000_000_000_000_000_000, "∞ years"), (1_000_000_000_000_000, "quintillion years"), (1_000_000_000_000, "trillion years"), (1_000_000_000, "billion years"), (1_000_000, "million years"), (10_000, "thousand years"), (1, "years")]
-    neg_magnitudes = [(.1, "months"), (.01, "days"), (.001, "hours"), (.0001, "minutes"), (.00001, "seconds"), (.000001, "less than a second")]
     crack_time = {}
 
+    for guess, log_years in get_crack_log_years(pool, length, GPS + (current_gps,)):
+        # Compared in log space so years is only materialized as a float
+        # once it's known to be small enough to print. Anything under the
+        # smallest magnitude is also less than a second.
+        i = max(bisect.bisect_right(LOG2_MAGNITUDES, log_years) - 1, 0)
+        magnitude, label = MAGNITUDE_LABELS[i]
+
+        if label in ("∞ years", "less than a second"):
+            crack_time[f'{int(guess):,}/s'] = label
+        elif log_years >= 0:
+            crack_time[f'{int(guess):,}/s'] = f'{(int(2**log_years)/magnitude):.2f} {label}'
+        else:
+            crack_time[f'{int(guess):,}/s'] = f'{(2**log_years/magnitude):.2f} {label}'
+
+    return crack_time
+
+
+def get_crack_log_years(pool, length, gps):
+    """
+    Numeric core of get_crack_time, kept free of any string formatting.
+
+    Works in log space, log₂(Pᴸ / gps / seconds per year), so that long
+    passwords never build the huge integer Pᴸ.
+
+    Parameters
+    ----------
+    pool : int
+    length: int
+    gps : list of guesses per second
+
+    Returns
+    -------
+    tuple : (guesses/s, log₂ of years to crack) for each element of gps
+    """
+
+    log_space = length * math.log2(pool)  # log₂(Pᴸ), i.e. entropy bits
+    log_year = math.log2(31536000)  # Seconds per year
+    crack_log_years = []
+
     for guess in gps:
         # More traditional method based on current day compute power and
         # how long it would take to crack the password.
-        time_to_crack = (((pool**length) / guess))  # In seconds
-
-        # seconds = time_to_crack
-        # minutes = time_to_crack / 60
-        # hours = time_to_crack / 3600
-        # days = time_to_crack / 86400
-        # weeks = time_to_crack / 604800
-        # months = time_to_crack / 2628000
-        years = time_to_crack / 31536000
-
-        if years >= 1:
-            for i in range(len(magnitudes)):
-                if years >= magnitudes[i][0]:
-                    crack_time[f'{int(guess):,}/s'] = "∞ years" if magnitudes[i][1] == "∞ years" else f'{(int(years)/magnitudes[i][0]):.2f} {magnitudes[i][1]}'
-                    break
-        else:
-            for i in range(len(neg_magnitudes)):
-                if years >= neg_magnitudes[i][0]:
-                    crack_time[f'{int(guess):,}/s'] = "less than a second" if neg_magnitudes[i][1] == "less than a second" else f'{(years/neg_magnitudes[i][0]):.2f} {neg_magnitudes[i][1]}'
-                    break
+        crack_log_years.append((guess, log_space - math.log2(guess) - log_year))
 
-    return crack_time
+    return tuple(crack_log_years)
+
+
+def get_filter_positions(full_hash, size):
+    """
+    Bit positions of a password hash in a Bloom filter
+
+    SHA1 is already uniformly distributed, so rather than hashing again the
+    positions come from the first 64 bits of the hash by double hashing.
+
+    Parameters
+    ----------
+    full_hash : string, SHA1 hex digest
+    size : int, number of bits in the filter
+
+    Returns
+    -------
+    generator : FILTER_HASHES bit positions
+    """
+
+    h1 = int(full_hash[:8], 16)
+    h2 = int(full_hash[8:16], 16) | 1
+
+    return ((h1 + i * h2) % size for i in range(FILTER_HASHES))
+
+
+def get_offline_count(directory, full_hash):
+    """
+    Binary search a sorted shard of the Pwned Passwords corpus for a hash
+
+    Parameters
+    ----------
+    directory : string
+    full_hash : string, upper case SHA1 hex digest
+
+    Returns
+    -------
+    string : Number of breaches the password has appeared in, None if not found
+
+    Raises
+    ------
+    FileNotFoundError : The shard for this hash is missing, so the password
+                        wasn't checked at all
+    """
+
+    path = os.path.join(directory, f"{full_hash[:2]}.txt")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No Pwned Passwords shard at {path}")
+    elif os.path.getsize(path) == 0:
+        return None
+
+    target = full_hash.encode()
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # lo and hi are always at the start of a line. Each pass reads the
+        # line containing the midpoint and discards the half it can't be in.
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            end = len(mm) if end == -1 else end
+
+            line_hash, _, count = mm[start:end].strip().partition(b":")  # Format SHA1_HASH:COUNT
+            if line_hash == target:
+                return count.decode()
+            elif line_hash < target:
+                lo = end + 1
+            else:
+                hi = start
+
+    return None
+
+
+def get_pool(password, pw_bytes=None):
+    """
+    Size of the pool of characters a password is drawn from
+
+    Parameters
+    ----------
+    password : string
+    pw_bytes : bytes, password already encoded as UTF-8 if the caller has it
+
+    Returns
+    -------
+    int : Sum of 26 lowercase, 26 uppercase, 10 digit and 32 symbol chars for
+          each class that appears in the password
+    """
+
+    mask = 0
+
+    if pw_bytes is None:
+        pw_bytes = password.encode("utf-8")
+
+    # Translate every byte to its class bits in one C call, leaving only the
+    # handful of distinct values to OR together
+    for bits in set(pw_bytes.translate(CLASS_LUT)):
+        mask |= bits
+
+    # Non-ASCII chars are left to the str methods so Unicode letters and
+    # digits still count. All 32 symbols are ASCII, so CLASS_LUT has already
+    # found any of them. Multiplying by the bools accumulates the class bits
+    # without a branch per class per char. isascii() is a flag lookup, so
+    # ASCII passwords skip this entirely.
+    if not password.isascii():
+        for x in password.translate(ASCII_DELETE):
+            mask |= x.islower() * LOWER | x.isupper() * UPPER | x.isdigit() * DIGIT
+
+    lowercase = 26 if mask & LOWER else 0
+    uppercase = 26 if mask & UPPER else 0
+    digits = 10 if mask & DIGIT else 0
+    symbols = 32 if mask & SYMBOL else 0
+
+    return lowercase + uppercase + digits + symbols
+
+
+def get_pwned_count(full_hash, offline, cache_file, cache_ttl):
+    """
+    Check if a password hash is listed in the haveibeenpwned.com database,
+    either through the API and the local cache or a downloaded corpus
+
+    Parameters
+    ----------
+    full_hash : string, upper case SHA1 hex digest
+    offline : string, directory of the downloaded corpus or None for the API
+    cache_file : string
+    cache_ttl : int, seconds a cached range is used before revalidating
+
+    Returns
+    -------
+    string : Number of breaches the password has appeared in, None if not found
+
+    Raises
+    ------
+    ConnectionError : The API couldn't be reached or kept failing and the
+                      range wasn't cached, so the password wasn't checked
+    """
+
+    if offline is not None:
+        return get_offline_count(offline, full_hash)
+
+    count = None
+    r = None
+    base_url = "https://api.pwnedpasswords.com/range/"
+    prefix, suffix = full_hash[:5], full_hash[5:]
+
+    cached = load_cache(cache_file, prefix)
+    if cached is not None and time.time() - cached[1] < cache_ttl:
+        r = cached[2]
+    else:
+        headers = {"If-None-Match": cached[0]} if cached is not None and cached[0] else None
+        response = get_request(f"{base_url}{prefix}", headers=headers)  # Send only first 5 chars of hash per API
+        if response is None or response.status_code not in (200, 304, 404):
+            if cached is None:
+                raise ConnectionError("Unable to reach haveibeenpwned.com")
+
+            # Breach counts only ever grow, so a stale range is still a valid
+            # answer when it can't be revalidated
+            r = cached[2]
+        elif response.status_code == 304:  # Range unchanged since it was cached
+            r = cached[2]
+            store_cache(cache_file, prefix, r, cached[0])
+        elif response.status_code == 200:
+            r = response.text
+            store_cache(cache_file, prefix, r, response.headers.get("ETag"))
+
+    if r is not None:
+        # Hash suffixes (minus first five chars) returned one per line as
+        # SHA1_HASH_SUFFIX:COUNT, mapped to the number of breaches the
+        # password has appeared in
+        hashes = dict(line.split(":", 1) for line in r.splitlines() if line)
+        count = hashes.get(suffix)
+        if count == "0":  # Padding added by the API, not a breach
+            count = None
 
+    return count
 
-def get_request(url, parameters=None):
+
+def get_request(url, parameters=None, headers=None, retries=5):
     """
     Makes requests more resillient to timeouts and failed connections
 
@@ -123,35 +538,69 @@ def get_request(url, parameters=None):
     ----------
     url : string
     parameters : dict
+    headers : dict
+    retries : int, number of times to retry before giving up
 
     Returns
     -------
-    var : Response from API, could be text, could be json
+    var : Response from API, could be text, could be json. None if the API
+          could not be reached or was still failing after every retry.
     """
 
-    try:
-        response = requests.get(url=url, params=parameters, timeout=2)
-    except:
-        for i in range(5, 0, -1):
-            print(f'Connection Error. Waiting... ({i})', end='\r')
-            time.sleep(1)
-        print('Retrying.' + ' '*50, end='\r')
-
-        # recusively try again
-        return get_request(url, parameters)
-
-    if response:
-        return response
-    elif response.status_code == 404:
-        return response
-    else:
-        for i in range(10, 0, -1):
-            print(f'No response, waiting 10 seconds... ({i})' + ' '*10, end='\r')
-            time.sleep(1)
-        print('Retrying.' + ' '*50, end='\r')
+    import requests  # Only needed for the API, so not imported at startup
+
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        if STOP_RETRIES.is_set():
+            break
 
-        # recusively try again
-        return get_request(url, parameters)
+        try:
+            response = session.get(url=url, params=parameters, headers=headers, timeout=2)
+        except requests.exceptions.RequestException:
+            pass
+        else:
+            if response or response.status_code == 404:
+                return response
+
+        # Back off exponentially, 1, 2, 4, 8... seconds capped at 30, waking
+        # early if STOP_RETRIES is set
+        if attempt == retries or STOP_RETRIES.wait(min(2**attempt, 30)):
+            break
+
+    return None
+
+
+def get_session():
+    """
+    Shared session for API calls, so retries and repeat lookups reuse the same
+    keep-alive connection rather than doing a new TCP and TLS handshake each time
+
+    Returns
+    -------
+    requests.Session
+    """
+
+    global SESSION
+
+    # --file looks up passwords on several threads at once, which must all get
+    # the same session
+    with SESSION_LOCK:
+        if SESSION is None:
+            import requests  # Only needed for the API, so not imported at startup
+
+            SESSION = requests.Session()
+
+            # No max_retries on the adapter, get_request's backoff loop does the
+            # retrying and a second layer would multiply the attempts
+            SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=10))
+
+            # Ask for a gzipped response, and for the API to pad it with fake zero
+            # count suffixes so the response size doesn't give away which hash
+            # was looked up
+            SESSION.headers.update({"Accept-Encoding": "gzip", "Add-Padding": "true", "User-Agent": "password_entropy_check"})
+
+    return SESSION
 
 
 def get_strength(entropy_bits):
@@ -168,13 +617,75 @@ def get_strength(entropy_bits):
     """
 
     entropy_bits = round(entropy_bits)
-    strengths = [(100, 'Critical'), (80, 'Important'), (60, 'Normal'), (0, 'Weak')]
-    
+
     # Iteratively tests entropy_bits >= 100, then >=80, then >= 60, then >=0
     # Once a test is True, returns the string value
-    for i in range(len(strengths)):
-        if entropy_bits >= strengths[i][0]:
-            return strengths[i][1]
+    for minimum_bits, strength in STRENGTHS:
+        if entropy_bits >= minimum_bits:
+            return strength
+
+
+def load_cache(cache_file, prefix):
+    """
+    Look up a previously downloaded hash range in the local cache
+
+    Parameters
+    ----------
+    cache_file : string
+    prefix : string
+
+    Returns
+    -------
+    tuple : (etag, timestamp, body) or None if the prefix is not cached
+    """
+
+    # The cache is only an optimization, so if it can't be opened, e.g. the
+    # script's directory isn't writable, carry on without it
+    try:
+        with CACHE_LOCK, shelve.open(cache_file) as cache:
+            return cache.get(prefix)
+    except (OSError, *dbm.error):
+        return None
+
+
+def load_filter(filter_file):
+    """
+    Map a Bloom filter made by build_filter into memory, once per run, so
+    each check_filter is only a few byte reads
+
+    Parameters
+    ----------
+    filter_file : string
+
+    Returns
+    -------
+    mmap.mmap : The filter's bits, or empty bytes if the file is empty
+    """
+
+    if os.path.getsize(filter_file) == 0:
+        return b""  # mmap can't map an empty file
+
+    with open(filter_file, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def store_cache(cache_file, prefix, body, etag):
+    """
+    Save a downloaded hash range to the local cache
+
+    Parameters
+    ----------
+    cache_file : string
+    prefix : string
+    body : string
+    etag : string
+    """
+
+    try:
+        with CACHE_LOCK, shelve.open(cache_file) as cache:
+            cache[prefix] = (etag, time.time(), body)
+    except (OSError, *dbm.error):
+        pass  # Not cached, see load_cache
 
 
 if __name__ == "__main__":
@@ -182,21 +693,79 @@ if __name__ == "__main__":
     # per second (gps)
     current_gps = 2.7e+12  # 2.7 trillion gps
 
-    if len(sys.argv) > 1:  # looking for a password as an argument
-        lowercase = 0
-        uppercase = 0
-        digits = 0
-        symbols = 0
-        symbolchars = "`~!@#$%^&*()-_=+[{]}\\|;:'\"/?,<.>"  # 32 symbols
+    # Hash ranges downloaded from haveibeenpwned.com are kept here and reused
+    # for cache_ttl seconds before being revalidated with the API's ETag.
+    cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hibp_cache.db")
+    cache_ttl = 7 * 86400  # One week
+
+    parser = argparse.ArgumentParser(description="Calculate bits of entropy for passwords, cracking time, and check if password has been breached", allow_abbrev=False)
+    parser.add_argument("password", nargs="?", help="password to check, prompts for it if omitted")
+    parser.add_argument("--offline", metavar="DIR", help="check breaches against a downloaded Pwned Passwords corpus in DIR instead of the API")
+    parser.add_argument("--filter", metavar="FILE", help="skip the breach check for passwords found in the Bloom filter FILE")
+    parser.add_argument("--file", metavar="PASSWORDS", help="check every password in PASSWORDS, one per line")
+    parser.add_argument("--build-filter", metavar="SOURCE", help="build the --filter FILE from a SHA1_HASH:COUNT file and exit")
+    args, extras = parser.parse_known_args()
+
+    # A password starting with - looks like an unknown option to argparse, so
+    # a single unrecognized argument is taken as the password
+    if len(extras) == 1 and args.password is None:
+        args.password = extras[0]
+    elif extras:
+        parser.error(f"unrecognized arguments: {' '.join(extras)}")
+
+    if args.build_filter is not None:
+        if args.filter is None:
+            parser.error("--build-filter requires --filter FILE to write to")
+        if not os.path.isfile(args.build_filter):
+            parser.error(f"--build-filter source not found: {args.build_filter}")
+
+        entries, skipped = build_filter(args.build_filter, args.filter)
+        print(f"Added {entries:,} hashes to {args.filter}")
+        if skipped:
+            print(f"Skipped {skipped:,} lines that don't start with a SHA1 hash")
+        sys.exit()
+
+    filter_bits = None
+    if args.filter is not None:
+        if not os.path.isfile(args.filter):
+            parser.error(f"--filter file not found: {args.filter}")
+        filter_bits = load_filter(args.filter)
+
+    if args.offline is not None and not os.path.isdir(args.offline):
+        parser.error(f"--offline directory not found: {args.offline}")
+
+    if args.file is not None:
+        if not os.path.isfile(args.file):
+            parser.error(f"--file not found: {args.file}")
+        check_file(args.file, current_gps, args.offline, filter_bits, cache_file, cache_ttl)
+        sys.exit()
+
+    password = args.password
+
+    if password is None:
+        password = getpass.getpass("Password (leave blank to enter password variables): ") or None
+
+    pwned = None
+    filtered = False
+
+    if password is not None:  # looking for a password as an argument
+        pw_bytes = password.encode("utf-8")  # Shared by the hash and get_pool
+
+        # SHA1 is only used as the lookup key for the API, not for security
+        full_hash = hashlib.sha1(pw_bytes, usedforsecurity=False).hexdigest().upper()
+
+        if filter_bits is not None and check_filter(filter_bits, full_hash):
+            filtered = True  # Common breached password, no need to look it up
+        else:
+            # Start the breach check first so its network round trip overlaps
+            # with the crack time math below, and only wait on it when it's
+            # printed
+            executor = ThreadPoolExecutor(max_workers=1)
+            pwned = executor.submit(get_pwned_count, full_hash, args.offline, cache_file, cache_ttl)
+            executor.shutdown(wait=False)
 
-        password = sys.argv[1]
         length = len(password)
-
-        for x in password:
-            digits = 10 if x.isdigit() else digits
-            lowercase = 26 if x.islower() else lowercase
-            uppercase = 26 if x.isupper() else uppercase
-            symbols = 32 if x in symbolchars else symbols
+        pool = get_pool(password, pw_bytes)
 
     else:  # No password given, prompt for password variables
         length = int(input("Password Length: "))
@@ -204,40 +773,17 @@ if __name__ == "__main__":
         uppercase = 26 if input("Include Uppercase (y/n): ").lower() == "y" else 0
         digits = 10 if input("Include Digits (y/n): ").lower() == "y" else 0
         symbols = 32 if input("Include Symbols (y/n): ").lower() == "y" else 0
+        pool = lowercase + uppercase + digits + symbols
 
-    pool = lowercase + uppercase + digits + symbols
-    entropy = math.log2(pool**length)
+    if pool:
+        entropy = length * math.log2(pool)
+        crack_time = get_crack_time(pool, length, current_gps)
+    else:  # No character classes at all, e.g. an empty password or only spaces
+        entropy = 0.0
+        crack_time = {f'{int(guess):,}/s': "less than a second" for guess in GPS + (current_gps,)}
 
     print(f"\nEntropy: {entropy:.2f} bits - Use Case: {get_strength(entropy)} account password")
 
-    if password is not None:
-        count = None
-        base_url = "https://api.pwnedpasswords.com/range/"
-        hash = hashlib.sha1(password.encode())
-        
-        response = get_request(f"{base_url}{hash.hexdigest()[:5]}")  # Send only first 5 chars of hash per API
-        if response.status_code == 200:
-            r = response.text
-            hashes = r.split("\r\n")  # Hash suffixes (minus first five chars) returned one per line as a string
-
-            for i in range(len(hashes)):
-                if hash.hexdigest().upper()[5:] in hashes[i]:  # Search for hash minus the first five chars
-                    hash_split = hashes[i].split(':')  # Format SHA1_HASH_SUFFIX:COUNT
-                    count = hash_split[1]  # Get the number of breaches the password has appeared in
-
-            if count is not None:
-                print(f"\nWARNING: {password} is listed in the haveibeenpwned.com database from {f'{int(count):,}'} breaches!")
-
-    print(f"\nWorst case (for hacker) to crack your password at various guesses per second.")
-
-    crack_time = get_crack_time(pool, length, current_gps)
-
-    cw = 25  # Column width for displayed output
-    for k, v in crack_time.items():
-        print(f"{k:<{cw}} {v:<{cw}}")
-
-    print(f"\nMoore's law method: How many years until a rig can generate enough guesses per\nsecond to crack the password in one hour.")
-
     # Alternative method based on Moore's law to get to a processing point
     # in years where the password could be cracked in under an hour. The article
     # was written in 2019 and assumed a current gps of 10⁹ whereas at the time of
@@ -252,9 +798,12 @@ if __name__ == "__main__":
     # nice long conversation with ChatGPT to come up with a better formula
     # which is below.
 
-    permutations_per_hour = pool**length / 3600
-    guesses_per_second_required = permutations_per_hour / 3600
-    time_to_crack_alt = math.log2(guesses_per_second_required / current_gps) / math.log2(2)
+    # permutations_per_hour = pool**length / 3600
+    # guesses_per_second_required = permutations_per_hour / 3600
+    # time_to_crack_alt = log₂(guesses_per_second_required / current_gps)
+    # Done in log space below so pool**length is never built, where
+    # log₂(pool**length) is the entropy already worked out above.
+    time_to_crack_alt = entropy - math.log2(current_gps) - math.log2(12_960_000)  # 3600 * 3600
 
     # At any rate, I thought it was a more interesting calculation than the standard
     # pool**length / gps, but understand that while Moore's Law states that the
@@ -269,4 +818,28 @@ if __name__ == "__main__":
     else:
         alt_years = f"{time_to_crack_alt:.2f} years"
 
+    if filtered:
+        print(f"\nWARNING: {password} is likely listed in the haveibeenpwned.com database as a common breached password!")
+    elif pwned is not None:
+        try:
+            if not wait([pwned], timeout=1).done:
+                print("\nWaiting for haveibeenpwned.com...")
+            count = pwned.result()
+        except (OSError, ImportError) as error:  # No API, missing shard, requests not installed
+            print(f"\n{error}, breach check skipped.")
+            count = None
+        except KeyboardInterrupt:
+            STOP_RETRIES.set()  # So the worker thread doesn't hold up exit
+            raise
+
+        if count is not None:
+            print(f"\nWARNING: {password} is listed in the haveibeenpwned.com database from {f'{int(count):,}'} breaches!")
+
+    print(f"\nWorst case (for hacker) to crack your password at various guesses per second.")
+
+    cw = 25  # Column width for displayed output
+    for k, v in crack_time.items():
+        print(f"{k:<{cw}} {v:<{cw}}")
+
+    print(f"\nMoore's law method: How many years until a rig can generate enough guesses per\nsecond to crack the password in one hour.")
     print(alt_years)